@@ -1,33 +1,57 @@
 import streamlit as st
-import google.generativeai as genai
 from PIL import Image
-import pdfplumber
 import os
-import pytesseract
+
+# Tesseract's internal OpenMP threading scales poorly and often runs slower
+# than serial; pin it to one thread and parallelize across images instead.
+# Must be set before any tesseract process is spawned.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# Heavy extraction/plotting modules (fitz, pytesseract, tesserocr, cv2,
+# plotly, google.generativeai) are imported lazily inside their call
+# sites so cold startup only pays for what the current request uses.
+import tempfile
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import time
-import matplotlib.pyplot as plt
+import random
+import threading
 from streamlit_lottie import st_lottie
-import requests
 from google.api_core import exceptions
-import base64
+import hashlib
+import io
 import json
 from typing import Optional, Dict, List
 from datetime import datetime
 import re
 
-# ------------------- Load environment variables -------------------
-load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    st.error("Gemini API key not found. Please set the GEMINI_API_KEY environment variable.")
-    st.stop()
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel('gemini-1.5-flash')
+# ------------------- Gemini client -------------------
+@st.cache_resource
+def get_model():
+    """Configure Gemini once per session and return the cached model handle"""
+    import google.generativeai as genai
+
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        st.error("Gemini API key not found. Please set the GEMINI_API_KEY environment variable.")
+        st.stop()
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel('gemini-1.5-flash')
 
 # ------------------- Constants -------------------
-MAX_RETRIES = 3
-RETRY_DELAY = 2  # seconds
+MAX_RETRIES = 5
+OCR_BATCH_SIZE = 50  # images per tesseract list file; longer lists can hang
+ANALYSIS_CACHE_TTL = 3600  # seconds a memoized analysis stays valid
+ANALYSIS_CACHE_MAX_ENTRIES = 64
+
+# Pre-compiled patterns used in the per-medication parsing loop
+SECTION_SPLIT_RE = re.compile(r"(?m)^## ")
+MED_ENTRY_RE = re.compile(r"^\s*[-*]\s+(.+?)(?=^\s*[-*]\s+|\Z)", re.MULTILINE | re.DOTALL)
+PCT_RE = re.compile(r"(\d{1,3})%")
+NUM_RE = re.compile(r"\d+")
 ANALYSIS_TEMPLATE = """
 ## 1. Key Findings
 [Concise bullet points of important findings]
@@ -49,8 +73,9 @@ ANALYSIS_TEMPLATE = """
 """
 
 # ------------------- Animation Assets -------------------
+@st.cache_data
 def load_lottie(filepath: str) -> Optional[Dict]:
-    """Load Lottie animation from file"""
+    """Load Lottie animation from file (cached so JSON parses once per session)"""
     try:
         with open(filepath, "r") as f:
             return json.load(f)
@@ -64,9 +89,12 @@ lottie_success = load_lottie("assets/success.json")
 lottie_doctor = load_lottie("assets/doctor.json")
 
 # ------------------- Custom CSS -------------------
-def set_custom_style():
-    st.markdown(
-        f"""
+STYLE_VERSION = 1  # bump to invalidate the cached stylesheet
+
+@st.cache_data
+def get_custom_css(version: int = STYLE_VERSION) -> str:
+    """Return the app stylesheet (cached so the CSS blob is hashed once per session)"""
+    return f"""
         <style>
         :root {{
             --primary: #6366f1;
@@ -169,6 +197,46 @@ def set_custom_style():
             transform: translateY(-3px);
             box-shadow: 0 8px 16px rgba(0, 0, 0, 0.2);
         }}
+
+        .medicine-card h4 {{
+            margin: 0;
+            color: var(--light);
+        }}
+
+        .medicine-card p {{
+            margin: 0.25rem 0;
+            color: #94a3b8;
+        }}
+
+        .med-header {{
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+        }}
+
+        .eff-badge {{
+            color: white;
+            padding: 0.25rem 0.5rem;
+            border-radius: 12px;
+            font-size: 0.8rem;
+        }}
+
+        /* Section headers shared across the results tabs */
+        .sec-header {{
+            display: flex;
+            align-items: center;
+            gap: 0.5rem;
+            margin-bottom: 1rem;
+        }}
+
+        .sec-header h3, .sec-header h4 {{
+            color: var(--light);
+            margin: 0;
+        }}
+
+        .sec-icon {{
+            font-size: 1.5rem;
+        }}
        
         .success-animation {{
             display: flex;
@@ -187,13 +255,21 @@ def set_custom_style():
             }}
         }}
         </style>
-        """,
-        unsafe_allow_html=True
-    )
+        """
+
+def set_custom_style():
+    st.markdown(get_custom_css(), unsafe_allow_html=True)
 
 # ------------------- AI Analysis -------------------
-def analyze_medical_report(content: str) -> str:
-    """Analyze medical report content with Gemini AI"""
+def analyze_medical_report(content: str, on_delta=None) -> str:
+    """Analyze medical report content with Gemini AI
+
+    Deliberately uncached: element calls made while a cached function
+    runs are recorded and replayed on hits, which breaks for a
+    placeholder owned by the caller. Memoization lives in run_analysis
+    instead. `on_delta` receives the accumulated text as chunks arrive
+    so the caller can render streaming progress.
+    """
     prompt = f"""
     Analyze this medical report and provide structured output with these exact section headers:
 
@@ -207,53 +283,267 @@ def analyze_medical_report(content: str) -> str:
     - Format with clear markdown headers
     """
    
+    model = get_model()
     for attempt in range(MAX_RETRIES):
         try:
-            response = model.generate_content(f"{prompt}\n\n{content}")
-            if response and hasattr(response, 'text'):
-                return response.text
-            raise ValueError("Invalid response from AI")
+            response = model.generate_content(f"{prompt}\n\n{content}", stream=True)
+            chunks = []
+            for chunk in response:
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    if on_delta:
+                        on_delta("".join(chunks))
+            if not chunks:
+                raise ValueError("Invalid response from AI")
+            return "".join(chunks)
         except (exceptions.GoogleAPIError, ValueError) as e:
             if attempt < MAX_RETRIES - 1:
-                time.sleep(RETRY_DELAY)
+                if isinstance(e, exceptions.ResourceExhausted):
+                    # Rate-limited (free tier is 15 RPM): back off hard,
+                    # with jitter so parallel sessions don't retry in sync
+                    time.sleep(min(60, 2 ** attempt + random.random()))
+                else:
+                    # Transient/validation errors can retry much sooner
+                    time.sleep(0.25 * 2 ** attempt)
             else:
-                st.error(f"Failed to analyze the report. Error: {str(e)}")
-                return "AI analysis failed. Please try again later."
+                # Re-raise so the failure propagates to main()'s error
+                # handler; run_analysis only memoizes successful returns.
+                raise
+
+@st.cache_resource
+def get_analysis_cache() -> Dict[str, tuple]:
+    """Process-wide {content hash: (text, stored_at)} memo of successful analyses
+
+    A plain dict under @st.cache_resource rather than @st.cache_data on
+    the analysis function itself: it stores only the final text, so no
+    recorded element messages can poison entries, and failures never
+    reach it because analyze_medical_report raises on failure.
+    """
+    return {}
+
+def run_analysis(content: str) -> str:
+    """Run the analysis with live streaming, memoizing successful results
+
+    Identical report text within the TTL returns the stored analysis
+    with zero API calls. Fresh generations render token by token into a
+    placeholder, which is cleared afterwards so the final text renders
+    in the results tabs.
+    """
+    cache = get_analysis_cache()
+    key = hashlib.sha1(content.encode()).hexdigest()
+    entry = cache.get(key)
+    if entry is not None:
+        text, stored_at = entry
+        if time.time() - stored_at < ANALYSIS_CACHE_TTL:
+            return text
+        del cache[key]
+
+    placeholder = st.empty()
+    try:
+        text = analyze_medical_report(content, on_delta=placeholder.markdown)
+    finally:
+        placeholder.empty()
+
+    if len(cache) >= ANALYSIS_CACHE_MAX_ENTRIES:
+        oldest = min(cache, key=lambda k: cache[k][1])
+        del cache[oldest]
+    cache[key] = (text, time.time())
+    return text
 
 # ------------------- Text Extraction -------------------
-def extract_text_from_pdf(uploaded_file) -> str:
-    """Extract text from PDF file"""
-    with pdfplumber.open(uploaded_file) as pdf:
-        return "\n".join(page.extract_text() or "" for page in pdf.pages)
+@st.cache_data(show_spinner=False)
+def extract_text_from_pdf(data: bytes) -> str:
+    """Extract text from PDF bytes
+
+    Uses PyMuPDF's C-backed parser, which is roughly an order of
+    magnitude faster than pdfplumber for plain text streams. Cached on
+    the file bytes so reruns of the same upload skip re-parsing.
+    """
+    import fitz  # PyMuPDF
+
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        # Single pass: call get_text once per page, skip blank pages so the
+        # joined output carries no empty segments. TEXTFLAGS_TEXT skips
+        # image-info collection the app never consumes.
+        texts = []
+        for page in doc:
+            text = page.get_text("text", flags=fitz.TEXTFLAGS_TEXT)
+            if text:
+                texts.append(text)
+        return "\n".join(texts)
+    finally:
+        doc.close()
+
+@st.cache_data(show_spinner=False)
+def ocr_pdf_pages(data: bytes, dpi: int = 200) -> str:
+    """OCR a scanned PDF by rasterizing its pages and running tesseract over them
+
+    Fallback for PDFs with no text layer: PyMuPDF's C rasterizer renders
+    each page once, then single-threaded tesseract processes (see
+    OMP_THREAD_LIMIT above) OCR the page images concurrently.
+    """
+    import fitz  # PyMuPDF
+    import pytesseract
+
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        images = []
+        for page in doc:
+            pixmap = page.get_pixmap(dpi=dpi)
+            images.append(Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples))
+    finally:
+        doc.close()
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        texts = list(executor.map(
+            lambda img: pytesseract.image_to_string(img, config="--oem 1"), images))
+    return "\n".join(texts)
+
+@st.cache_resource
+def get_ocr():
+    """Return a tesseract API handle plus its lock, shared across sessions
+
+    The in-process binding loads the language model once, unlike the
+    pytesseract subprocess which reloads it (~500 ms) on every call.
+    SINGLE_BLOCK page segmentation skips layout analysis, which the
+    preprocessed single-block report images don't need. Returns None
+    when tesserocr is not installed.
+
+    cache_resource shares one handle across all sessions and script-run
+    threads, and SetImage/GetUTF8Text is a stateful two-step, so callers
+    must hold the returned lock around the pair.
+    """
+    try:
+        from tesserocr import PyTessBaseAPI, OEM, PSM
+    except ImportError:
+        return None
+    return PyTessBaseAPI(lang="eng", oem=OEM.LSTM_ONLY, psm=PSM.SINGLE_BLOCK), threading.Lock()
+
+def preprocess_for_ocr(image: Image.Image) -> Image.Image:
+    """Binarize an image so tesseract sees a clean bi-level input
+
+    Grayscale plus adaptive thresholding cuts tesseract's segmentation
+    work on low-contrast or color scans and improves recognition, which
+    avoids downstream retries on garbled text.
+    """
+    gray = image.convert("L")
+    try:
+        import cv2
+    except ImportError:
+        return gray
+    binary = cv2.adaptiveThreshold(
+        np.asarray(gray), 255,
+        cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10
+    )
+    return Image.fromarray(binary)
 
 def extract_text_from_image(image) -> str:
     """Extract text from image using OCR"""
-    return pytesseract.image_to_string(image)
+    image = preprocess_for_ocr(image)
+    ocr = get_ocr()
+    if ocr is None:
+        # tesserocr not installed; fall back to the subprocess path
+        import pytesseract
+        return pytesseract.image_to_string(image, config="--oem 1 --psm 6")
+    api, lock = ocr
+    with lock:
+        api.SetImage(image)
+        return api.GetUTF8Text()
+
+@st.cache_data(show_spinner=False)
+def decode_image(data: bytes) -> Image.Image:
+    """Decode uploaded image bytes into a fully-loaded PIL image, once per upload
+
+    convert() forces decoding immediately, so the image never depends on
+    the upload buffer's cursor position, and caching means the preview
+    and OCR share one decode instead of re-opening the file.
+    """
+    return Image.open(io.BytesIO(data)).convert("RGB")
+
+@st.cache_data(show_spinner=False)
+def preview_image(data: bytes, max_size: int = 1024) -> Image.Image:
+    """Build a small preview thumbnail from uploaded image bytes
+
+    draft() downscales JPEGs in the DCT domain during decode, far
+    cheaper than decoding a phone-camera photo at full resolution and
+    resizing after; thumbnail() finishes the job for other formats.
+    OCR keeps using the full-resolution decode_image result.
+    """
+    image = Image.open(io.BytesIO(data))
+    image.draft("RGB", (max_size, max_size))
+    image.thumbnail((max_size, max_size))
+    return image.convert("RGB")  # JPEG output requires no alpha channel
+
+@st.cache_data(show_spinner=False)
+def extract_text_from_image_bytes(data: bytes) -> str:
+    """OCR image bytes, cached on the upload's digest so reruns skip tesseract"""
+    return extract_text_from_image(decode_image(data))
+
+def extract_text_from_images(paths: List[str]) -> str:
+    """Extract text from multiple image files in one OCR pass
+
+    tesseract reloads its language model on every invocation, so calling
+    it per image wastes ~20% of runtime on startup alone. Passing a list
+    file OCRs a whole batch in a single process. Batches are chunked
+    because tesseract can hang on very long list files, and the chunks
+    run concurrently: with OMP_THREAD_LIMIT=1 each tesseract process is
+    single-threaded, so process-level parallelism scales with cores.
+    """
+    import pytesseract
+
+    chunks = [paths[start:start + OCR_BATCH_SIZE]
+              for start in range(0, len(paths), OCR_BATCH_SIZE)]
+
+    def ocr_chunk(chunk: List[str]) -> str:
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as list_file:
+            list_file.write("\n".join(chunk))
+            list_path = list_file.name
+        try:
+            return pytesseract.image_to_string(list_path, config="--oem 1")
+        finally:
+            os.unlink(list_path)
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        texts = list(executor.map(ocr_chunk, chunks))
+    return "\n".join(texts)
 
 # ------------------- Result Processing -------------------
+@st.cache_data
+def parse_sections(content: str) -> Dict[str, str]:
+    """Split analysis results into a {header: body} dict in one pass
+
+    The tabs and charts each pull several sections out of the same
+    multi-KB response; parsing it once beats re-scanning the whole
+    string per lookup.
+    """
+    sections = {}
+    for part in SECTION_SPLIT_RE.split(content):
+        if "\n" in part:
+            header, body = part.split("\n", 1)
+            sections["## " + header.strip()] = body
+    return sections
+
 def extract_section(content: str, section_title: str) -> str:
     """Extract specific section from analysis results"""
-    if section_title not in content:
+    body = parse_sections(content).get(section_title)
+    if body is None:
         return f"## {section_title}\nNo information found in this section."
-   
-    section_start = content.index(section_title)
-    remaining_content = content[section_start:]
-   
-    # Find the next section header or end of content
-    next_section_pos = remaining_content.find("## ", len(section_title))
-    if next_section_pos != -1:
-        return remaining_content[:next_section_pos].strip()
-    return remaining_content.strip()
+    return f"{section_title}\n{body}".strip()
 
 def parse_medications(content: str) -> List[Dict]:
     """Parse medication recommendations from analysis results"""
-    medications = []
     med_section = extract_section(content, "## 3. Medication Recommendations")
-    
-    # Split into individual medication entries
-    med_entries = re.split(r"\n\s*[-*]\s+", med_section)[1:]  # Skip first empty split
-    
-    for entry in med_entries:
+
+    # Section missing or empty: skip entry parsing entirely
+    if "No information found" in med_section or not med_section.strip():
+        return []
+
+    medications = []
+    # finditer yields bullet entries directly, without materializing a
+    # split list whose first element is always discarded
+    for match in MED_ENTRY_RE.finditer(med_section):
+        entry = match.group(1)
         med_data = {}
         lines = [line.strip() for line in entry.split("\n") if line.strip()]
         
@@ -265,19 +555,19 @@ def parse_medications(content: str) -> List[Dict]:
         med_data["name"] = first_line.split("(")[0].split(":")[0].strip()
         
         # Extract effectiveness if available
-        eff_match = re.search(r"(\d{1,3})%", first_line)
+        eff_match = PCT_RE.search(first_line)
         if eff_match:
             med_data["effectiveness"] = int(eff_match.group(1))
         elif "Effectiveness:" in first_line:
             # Handle cases where effectiveness is mentioned but not as percentage
             eff_text = first_line.split("Effectiveness:")[1].strip()
             if "%" in eff_text:
-                eff_match = re.search(r"(\d{1,3})%", eff_text)
+                eff_match = PCT_RE.search(eff_text)
                 if eff_match:
                     med_data["effectiveness"] = int(eff_match.group(1))
             else:
                 # Try to extract any number
-                num_match = re.search(r"\d+", eff_text)
+                num_match = NUM_RE.search(eff_text)
                 if num_match:
                     med_data["effectiveness"] = int(num_match.group())
         
@@ -313,7 +603,7 @@ def plot_medicine_effectiveness(medications: List[Dict]):
         # Handle different effectiveness formats
         if isinstance(eff, str):
             # Extract first number from strings like "70-80%"
-            numbers = re.findall(r'\d+', eff)
+            numbers = NUM_RE.findall(eff)
             if numbers:
                 eff = int(numbers[0])
             else:
@@ -321,76 +611,48 @@ def plot_medicine_effectiveness(medications: List[Dict]):
         
         names.append(name)
         effectiveness.append(eff)
-    
-    # Create figure with dark theme
-    plt.style.use('dark_background')
-    fig, ax = plt.subplots(figsize=(10, 6))
-    
-    # Gradient bars
-    colors = plt.cm.viridis([eff/100 for eff in effectiveness])
-    bars = ax.barh(names, effectiveness, color=colors)
-    
-    # Add value labels
-    for bar in bars:
-        width = bar.get_width()
-        ax.text(width + 1, bar.get_y() + bar.get_height()/2,
-                f'{width}%',
-                ha='left', va='center',
-                color='white', fontsize=10)
-    
-    # Styling
-    ax.set_xlim(0, 100)
-    ax.set_xlabel('Effectiveness (%)')
-    ax.set_title('Medication Effectiveness Comparison', pad=20)
-    ax.spines['top'].set_visible(False)
-    ax.spines['right'].set_visible(False)
-    ax.spines['left'].set_color('#64748b')
-    ax.spines['bottom'].set_color('#64748b')
-    ax.tick_params(colors='#94a3b8', which='both')
-    ax.set_facecolor('none')
-    fig.patch.set_facecolor('none')
-    
-    st.pyplot(fig)
+
+    # Vega-Lite renders client-side from the data frame, so the server
+    # ships a tiny JSON payload instead of a rasterized PNG
+    df = pd.DataFrame({"Effectiveness (%)": effectiveness}, index=names)
+    st.bar_chart(df, horizontal=True, color="#6366f1")
 
 def create_diagnosis_chart(content: str):
     """Create a pie chart of disease classification"""
-    labels = ['Chronic', 'Infectious', 'Common', 'Other']
-    sizes = [25, 25, 25, 25]  # Default distribution
-    
+    labels = ('Chronic', 'Infectious', 'Common', 'Other')
+    sizes = (25, 25, 25, 25)  # Default distribution
+
     if "## 5. Disease Classification" in content:
         classification = extract_section(content, "## 5. Disease Classification").lower()
         if "chronic" in classification:
-            sizes = [40, 20, 20, 20]
+            sizes = (40, 20, 20, 20)
         if "infectious" in classification:
-            sizes = [20, 40, 20, 20]
+            sizes = (20, 40, 20, 20)
         if "common" in classification:
-            sizes = [20, 20, 40, 20]
-    
-    # Create figure with dark theme
-    plt.style.use('dark_background')
-    fig, ax = plt.subplots(figsize=(8, 8))
-    
-    # Custom colors
-    colors = ['#6366f1', '#10b981', '#f59e0b', '#64748b']
-    
-    # Explode the dominant slice
+            sizes = (20, 20, 40, 20)
+
+    import plotly.express as px
+
+    # Plotly renders the pie client-side from JSON data; the server never
+    # rasterizes anything
+    fig = px.pie(
+        values=sizes, names=labels,
+        color_discrete_sequence=['#6366f1', '#10b981', '#f59e0b', '#64748b']
+    )
+
+    # Pull out the dominant slice
     max_index = sizes.index(max(sizes))
-    explode = [0.1 if i == max_index else 0 for i in range(len(sizes))]
-    
-    # Plot
-    wedges, texts, autotexts = ax.pie(
-        sizes, explode=explode, labels=labels, colors=colors,
-        autopct='%1.1f%%', startangle=90, shadow=True,
-        wedgeprops={'linewidth': 1, 'edgecolor': '#1e293b'},
-        textprops={'color': 'white', 'fontsize': 10}
+    fig.update_traces(
+        pull=[0.1 if i == max_index else 0 for i in range(len(sizes))],
+        marker_line={'width': 1, 'color': '#1e293b'},
+        textfont={'color': 'white', 'size': 12}
     )
-    
-    # Style
-    ax.set_title('Disease Classification', color='white', pad=20)
-    plt.setp(autotexts, size=10, weight="bold", color="white")
-    fig.patch.set_facecolor('none')
-    
-    st.pyplot(fig)
+    fig.update_layout(
+        title={'text': 'Disease Classification', 'font': {'color': 'white'}},
+        paper_bgcolor='rgba(0,0,0,0)',
+        legend={'font': {'color': '#f8fafc'}}
+    )
+    st.plotly_chart(fig, use_container_width=True)
 
 # ------------------- UI Components -------------------
 def render_upload_section():
@@ -430,147 +692,113 @@ def render_upload_success():
             </h4>
             """, unsafe_allow_html=True)
 
-def render_medication_cards(medications: List[Dict]):
-    """Render medication cards with details"""
+def section_header(icon: str, title: str, tag: str = "h3") -> str:
+    """Build the HTML for an icon + title section header
+
+    Styling lives in the cached stylesheet (.sec-header/.sec-icon) so
+    each header ships class names instead of repeated inline styles.
+    """
+    return (
+        f'<div class="sec-header">'
+        f'<span class="sec-icon">{icon}</span>'
+        f'<{tag}>{title}</{tag}>'
+        f'</div>'
+    )
+
+def medication_cards_html(medications: List[Dict]) -> str:
+    """Build medication cards (or the no-data notice) as one HTML string"""
     if not medications:
-        st.info("No specific medication recommendations found")
-        return
-    
+        return """<div class="highlight-box" style="margin: 1rem 0;">
+<p style="margin: 0; color: #94a3b8;">
+⚠️ No specific medication recommendations were found in the analysis.
+Please consult with your healthcare provider for personalized advice.
+</p>
+</div>"""
+
+    cards = []
     for med in medications:
         effectiveness = med.get("effectiveness", "N/A")
         dosage = med.get("dosage", "Not specified")
         side_effects = med.get("side_effects", "Not specified")
-        
+
         # Handle both string and integer effectiveness values
         if isinstance(effectiveness, str) and "%" in effectiveness:
             try:
                 effectiveness = int(effectiveness.replace("%", "").strip())
             except ValueError:
                 pass
-        
-        st.markdown(f"""
-        <div class="medicine-card">
-            <div style="display: flex; justify-content: space-between; align-items: center;">
-                <h4 style="margin: 0; color: #f8fafc;">{med.get('name', 'Unnamed Medication')}</h4>
-                <div style="background: {'#10b981' if isinstance(effectiveness, int) and effectiveness > 70 else '#f59e0b' if isinstance(effectiveness, int) and effectiveness > 40 else '#ef4444'};
-                            color: white; padding: 0.25rem 0.5rem; border-radius: 12px; font-size: 0.8rem;">
-                    {effectiveness if isinstance(effectiveness, int) else effectiveness}% effective
-                </div>
-            </div>
-            <div style="margin-top: 0.5rem;">
-                <p style="margin: 0.25rem 0; color: #94a3b8;"><strong>Dosage:</strong> {dosage}</p>
-                <p style="margin: 0.25rem 0; color: #94a3b8;"><strong>Side Effects:</strong> {side_effects}</p>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+
+        badge_color = ('#10b981' if isinstance(effectiveness, int) and effectiveness > 70
+                       else '#f59e0b' if isinstance(effectiveness, int) and effectiveness > 40
+                       else '#ef4444')
+        cards.append(f"""<div class="medicine-card">
+<div class="med-header">
+<h4>{med.get('name', 'Unnamed Medication')}</h4>
+<div class="eff-badge" style="background: {badge_color};">
+{effectiveness}% effective
+</div>
+</div>
+<div style="margin-top: 0.5rem;">
+<p><strong>Dosage:</strong> {dosage}</p>
+<p><strong>Side Effects:</strong> {side_effects}</p>
+</div>
+</div>""")
+    return "\n".join(cards)
 
 def render_analysis_tabs(analysis_result: str):
-    """Render the analysis results in tabs with improved layout"""
+    """Render the analysis results in tabs, one markdown payload per tab
+
+    Each st.markdown call is a separate delta message to the frontend;
+    concatenating the fragments per tab keeps reruns to a handful of
+    messages instead of ~20.
+    """
     tab1, tab2, tab3, tab4 = st.tabs(["📋 Summary", "💊 Medications", "🧘 Lifestyle", "📊 Insights"])
-    
+
     with tab1:
-        st.markdown("""
-        <div class="card">
-            <div style="display: flex; align-items: center; gap: 0.5rem; margin-bottom: 1rem;">
-                <span style="font-size: 1.5rem;">📋</span>
-                <h3 style="color: #f8fafc; margin: 0;">Key Findings</h3>
-            </div>
-        """, unsafe_allow_html=True)
-       
         key_findings = extract_section(analysis_result, "## 1. Key Findings")
-        st.markdown(key_findings.replace("## 1. Key Findings", "").strip(), unsafe_allow_html=True)
-       
-        st.markdown("""
-            <div class="card">
-            <div style="display: flex; align-items: center; gap: 0.5rem; margin-bottom: 1rem;">
-                <span style="font-size: 1.5rem;">🩺</span>
-                <h3 style="color: #f8fafc; margin: 0;">Potential Diagnoses</h3>
-            </div>
-        """, unsafe_allow_html=True)
-       
         diagnoses = extract_section(analysis_result, "## 2. Potential Diagnoses")
-        st.markdown(diagnoses.replace("## 2. Potential Diagnoses", "").strip(), unsafe_allow_html=True)
-       
-        st.markdown("</div>", unsafe_allow_html=True)
-    
+        st.markdown("\n\n".join([
+            f'<div class="card">{section_header("📋", "Key Findings")}</div>',
+            key_findings.replace("## 1. Key Findings", "").strip(),
+            f'<div class="card">{section_header("🩺", "Potential Diagnoses")}</div>',
+            diagnoses.replace("## 2. Potential Diagnoses", "").strip(),
+        ]), unsafe_allow_html=True)
+
     with tab2:
-        st.markdown("""
-        <div class="card">
-            <div style="display: flex; align-items: center; gap: 0.5rem; margin-bottom: 1rem;">
-                <span style="font-size: 1.5rem;">💊</span>
-                <h3 style="color: #f8fafc; margin: 0;">Medication Recommendations</h3>
-            </div>
-        """, unsafe_allow_html=True)
-       
         medications = parse_medications(analysis_result)
-       
-        if not medications:
-            st.markdown("""
-            <div class="highlight-box" style="margin: 1rem 0;">
-                <p style="margin: 0; color: #94a3b8;">
-                    ⚠️ No specific medication recommendations were found in the analysis.
-                    Please consult with your healthcare provider for personalized advice.
-                </p>
-            </div>
-            """, unsafe_allow_html=True)
-        else:
-            render_medication_cards(medications)
-            
-            st.markdown("""
-                <div style="display: flex; align-items: center; gap: 0.5rem; margin-top: 2rem; margin-bottom: 1rem;">
-                    <span style="font-size: 1.5rem;">📈</span>
-                    <h3 style="color: #f8fafc; margin: 0;">Effectiveness Comparison</h3>
-                </div>
-            """, unsafe_allow_html=True)
-            
+        parts = [
+            f'<div class="card">{section_header("💊", "Medication Recommendations")}</div>',
+            medication_cards_html(medications),
+        ]
+        if medications:
+            parts.append(section_header("📈", "Effectiveness Comparison"))
+        st.markdown("\n\n".join(parts), unsafe_allow_html=True)
+        if medications:
             plot_medicine_effectiveness(medications)
-       
-        st.markdown("</div>", unsafe_allow_html=True)
-    
+
     with tab3:
-        st.markdown("""
-        <div class="card">
-            <div style="display: flex; align-items: center; gap: 0.5rem; margin-bottom: 1rem;">
-                <span style="font-size: 1.5rem;">🧘</span>
-                <h3 style="color: #f8fafc; margin: 0;">Lifestyle Recommendations</h3>
-            </div>
-        """, unsafe_allow_html=True)
-       
         lifestyle = extract_section(analysis_result, "## 4. Lifestyle Guidance")
-        st.markdown(lifestyle.replace("## 4. Lifestyle Guidance", "").strip(), unsafe_allow_html=True)
-       
-        st.markdown("</div>", unsafe_allow_html=True)
-    
+        st.markdown("\n\n".join([
+            f'<div class="card">{section_header("🧘", "Lifestyle Recommendations")}</div>',
+            lifestyle.replace("## 4. Lifestyle Guidance", "").strip(),
+        ]), unsafe_allow_html=True)
+
     with tab4:
-        st.markdown("""
-        <div class="card">
-            <div style="display: flex; align-items: center; gap: 0.5rem; margin-bottom: 1rem;">
-                <span style="font-size: 1.5rem;">📊</span>
-                <h3 style="color: #f8fafc; margin: 0;">Health Insights</h3>
-            </div>
-        """, unsafe_allow_html=True)
-       
+        st.markdown(f'<div class="card">{section_header("📊", "Health Insights")}</div>',
+                    unsafe_allow_html=True)
+
         col1, col2 = st.columns([1, 1])
         with col1:
-            st.markdown("""
-                <div style="display: flex; align-items: center; gap: 0.5rem; margin-bottom: 1rem;">
-                    <span style="font-size: 1.5rem;">🏷️</span>
-                    <h4 style="color: #f8fafc; margin: 0;">Disease Classification</h4>
-                </div>
-            """, unsafe_allow_html=True)
+            st.markdown(section_header("🏷️", "Disease Classification", tag="h4"),
+                        unsafe_allow_html=True)
             create_diagnosis_chart(analysis_result)
-       
+
         with col2:
-            st.markdown("""
-                <div style="display: flex; align-items: center; gap: 0.5rem; margin-bottom: 1rem;">
-                    <span style="font-size: 1.5rem;">🔄</span>
-                    <h4 style="color: #f8fafc; margin: 0;">Next Steps</h4>
-                </div>
-            """, unsafe_allow_html=True)
             next_steps = extract_section(analysis_result, "## 6. Next Steps")
-            st.markdown(next_steps.replace("## 6. Next Steps", "").strip(), unsafe_allow_html=True)
-       
-        st.markdown("</div>", unsafe_allow_html=True)
+            st.markdown("\n\n".join([
+                section_header("🔄", "Next Steps", tag="h4"),
+                next_steps.replace("## 6. Next Steps", "").strip(),
+            ]), unsafe_allow_html=True)
 
 # ------------------- Main App -------------------
 def main():
@@ -612,8 +840,9 @@ def main():
         if uploaded_file and not st.session_state.analysis_done:
             try:
                 if file_type == "Image":
-                    image = Image.open(uploaded_file)
-                    st.image(image, caption="Uploaded Medical Report", use_column_width=True)
+                    st.image(preview_image(uploaded_file.getvalue()),
+                             caption="Uploaded Medical Report",
+                             use_column_width=True, output_format="JPEG")
                 render_upload_success()
                 st.session_state.file_uploaded = True
             except Exception as e:
@@ -629,16 +858,19 @@ def main():
                     try:
                         # Extract text based on file type
                         if file_type == "PDF":
-                            extracted_text = extract_text_from_pdf(uploaded_file)
+                            extracted_text = extract_text_from_pdf(uploaded_file.getvalue())
+                            if not extracted_text.strip():
+                                # Scanned PDF with no text layer: rasterize and OCR
+                                extracted_text = ocr_pdf_pages(uploaded_file.getvalue())
                         else:
-                            extracted_text = extract_text_from_image(image)
+                            extracted_text = extract_text_from_image_bytes(uploaded_file.getvalue())
                        
                         if not extracted_text.strip():
                             st.error("No readable text found in the document.")
                             return
                            
                         # Analyze with AI
-                        st.session_state.analysis_result = analyze_medical_report(extracted_text)
+                        st.session_state.analysis_result = run_analysis(extracted_text)
                         st.session_state.analysis_done = True
                        
                     except Exception as e: